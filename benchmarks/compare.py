@@ -0,0 +1,64 @@
+"""
+Compare two benchmark result files and report regressions.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.1
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+# Metric used for each benchmark kind, lower is better
+METRICS = {"micro": "median_us", "load": "p95_ms", "replay": "p95_ms"}
+
+
+def compare(
+    baseline: Dict, candidate: Dict, threshold: float
+) -> List[Tuple[str, float, float, float]]:
+    """
+    Compare benchmark results.
+    :param baseline: Baseline results.
+    :param candidate: Candidate results.
+    :param threshold: Relative slowdown considered a regression.
+    :return: (name, baseline, candidate, ratio) of the regressed benchmarks.
+    """
+    metric = METRICS[baseline["kind"]]
+    regressions = []
+    for name, before in baseline["results"].items():
+        after = candidate["results"].get(name)
+        if after is None or not before.get(metric) or metric not in after:
+            continue
+
+        ratio = after[metric] / before[metric]
+        print(f"{name:40} {before[metric]:12.3f} {after[metric]:12.3f} {ratio:7.2f}x")
+        if ratio > 1 + threshold:
+            regressions.append((name, before[metric], after[metric], ratio))
+    return regressions
+
+
+def main() -> None:
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    regressions = compare(baseline, candidate, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}:")
+        for name, _, _, ratio in regressions:
+            print(f"  {name}: {ratio:.2f}x")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Load generator for the sheet API.
+
+Starts a local uvicorn server (unless --url is given), fills a few sheets and
+drives a mix of reads and writes from concurrent asyncio workers, reporting
+throughput and latency percentiles per endpoint.
+
+    python -m benchmarks.load --duration 10 --concurrency 32 -o load.json
+"""
+
+import argparse
+import asyncio
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.results import percentiles, write_results
+
+COLUMNS = [
+    {"name": "A", "type": "string"},
+    {"name": "B", "type": "int"},
+    {"name": "C", "type": "string"},
+]
+
+
+def endpoint_name(method: str, path: str) -> str:
+    """
+    Name an endpoint by its route, with sheet IDs replaced by a placeholder.
+    :param method: HTTP method.
+    :param path: Request path.
+    :return: Endpoint name.
+    """
+    parts = path.split("/")
+    for i, part in enumerate(parts[:-1]):
+        if part == "sheet" and parts[i + 1]:
+            parts[i + 1] = "{sheet_id}"
+    return f"{method} {'/'.join(parts)}"
+
+
+def free_port() -> int:
+    """
+    Find a free local TCP port.
+    :return: Port number.
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def start_server(port: int) -> subprocess.Popen:
+    """
+    Start main:app under uvicorn and wait until it answers.
+    :param port: Port to listen on.
+    :return: The server process.
+    """
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ]
+    )
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(f"http://127.0.0.1:{port}/")
+                return process
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+
+    process.terminate()
+    raise RuntimeError("Server did not start.")
+
+
+async def populate(client: httpx.AsyncClient, sheets: int, rows: int) -> List[str]:
+    """
+    Create sheets holding values and lookups.
+    :param client: HTTP client.
+    :param sheets: Number of sheets.
+    :param rows: Rows per sheet.
+    :return: Sheet IDs.
+    """
+    sheet_ids = []
+    for _ in range(sheets):
+        response = await client.post("/api/v1/sheet/", json={"columns": COLUMNS})
+        sheet_id = response.json()["sheetId"]
+        for row in range(rows):
+            await client.post(
+                f"/api/v1/sheet/{sheet_id}/set",
+                json={"row": row, "column": "A", "value": f"value {row}"},
+            )
+            await client.post(
+                f"/api/v1/sheet/{sheet_id}/set",
+                json={"row": row, "column": "C", "value": f"lookup(A,{row})"},
+            )
+        sheet_ids.append(sheet_id)
+    return sheet_ids
+
+
+async def worker(
+    client: httpx.AsyncClient,
+    sheet_ids: List[str],
+    rows: int,
+    read_ratio: float,
+    deadline: float,
+    latencies: Dict[str, List[float]],
+    errors: Dict[str, int],
+) -> None:
+    """
+    Issue requests until the deadline.
+    :param client: HTTP client.
+    :param sheet_ids: Sheets to hit.
+    :param rows: Rows per sheet.
+    :param read_ratio: Fraction of requests that read a whole sheet.
+    :param deadline: perf_counter value to stop at.
+    :param latencies: Endpoint name -> latencies of successful requests, filled
+        in place.
+    :param errors: Endpoint name -> number of error responses, filled in place.
+    :return: None
+    """
+    while time.perf_counter() < deadline:
+        sheet_id = random.choice(sheet_ids)
+        start = time.perf_counter()
+        if random.random() < read_ratio:
+            name = "GET /api/v1/sheet/{sheet_id}"
+            response = await client.get(f"/api/v1/sheet/{sheet_id}")
+        else:
+            name = "POST /api/v1/sheet/{sheet_id}/set"
+            response = await client.post(
+                f"/api/v1/sheet/{sheet_id}/set",
+                json={
+                    "row": random.randrange(rows),
+                    "column": "B",
+                    "value": random.randrange(1000),
+                },
+            )
+        elapsed = time.perf_counter() - start
+
+        # Failed requests are counted apart so they do not skew the latencies
+        samples = latencies.setdefault(name, [])
+        errors.setdefault(name, 0)
+        if response.is_success:
+            samples.append(elapsed)
+        else:
+            errors[name] += 1
+
+
+async def run(
+    url: Optional[str],
+    duration: float,
+    concurrency: int,
+    sheets: int,
+    rows: int,
+    read_ratio: float,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Run the load test.
+    :return: Endpoint name -> throughput and latency percentiles of successful
+        requests, and the number of error responses.
+    """
+    process = None
+    if url is None:
+        port = free_port()
+        process = await start_server(port)
+        url = f"http://127.0.0.1:{port}"
+
+    try:
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+            sheet_ids = await populate(client, sheets, rows)
+            latencies: Dict[str, List[float]] = {}
+            errors: Dict[str, int] = {}
+            deadline = time.perf_counter() + duration
+            await asyncio.gather(
+                *(
+                    worker(
+                        client,
+                        sheet_ids,
+                        rows,
+                        read_ratio,
+                        deadline,
+                        latencies,
+                        errors,
+                    )
+                    for _ in range(concurrency)
+                )
+            )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    results = {}
+    for name, samples in latencies.items():
+        results[name] = {
+            **percentiles(samples),
+            "rps": len(samples) / duration,
+            "errors": errors[name],
+        }
+    return results
+
+
+def main() -> None:
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-o", "--output", default="-", help="JSON output file")
+    parser.add_argument("--url", help="Target server instead of a local one")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--sheets", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--read-ratio", type=float, default=0.5)
+    args = parser.parse_args()
+
+    results = asyncio.run(
+        run(
+            args.url,
+            args.duration,
+            args.concurrency,
+            args.sheets,
+            args.rows,
+            args.read_ratio,
+        )
+    )
+    write_results(args.output, "load", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Microbenchmarks of SheetManager.
+
+    python -m benchmarks.micro -o micro.json
+"""
+
+import argparse
+import itertools
+import json
+import time
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+
+from benchmarks.results import write_results
+from codec import decode_set_cell, encode_sheet
+from models import ColumnSchema, SetCellRequest, SheetSchema
+from service import SheetManager
+
+COLUMNS = [ColumnSchema(name=name, type="string") for name in ("A", "B", "C", "D")]
+
+
+def timeit(func: Callable[[], Any], repeat: int, number: int) -> Dict[str, float]:
+    """
+    Time a callable.
+    :param func: The callable.
+    :param repeat: Number of timed rounds.
+    :param number: Calls per round.
+    :return: Best and median time per call in microseconds.
+    """
+    rounds: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        rounds.append((time.perf_counter() - start) / number * 1e6)
+
+    rounds.sort()
+    return {"best_us": rounds[0], "median_us": rounds[len(rounds) // 2]}
+
+
+def alternating_writes(
+    manager: SheetManager, sheet_id: str, row: int, column: str
+) -> Callable[[], Any]:
+    """
+    Build a write that alternates between two values, so that every call
+    changes the resolved value and propagates to the cell's dependents.
+    :param manager: The sheet manager.
+    :param sheet_id: Sheet ID.
+    :param row: Row of the written cell.
+    :param column: Column of the written cell.
+    :return: The write.
+    """
+    values = itertools.cycle(("value", "other value"))
+    return lambda: manager.set_cell(sheet_id, row, column, next(values))
+
+
+def filled_sheet(manager: SheetManager, rows: int) -> str:
+    """
+    Create a sheet with plain values in every cell and a lookup in column D.
+    :param manager: The sheet manager.
+    :param rows: Number of rows.
+    :return: Sheet ID.
+    """
+    sheet_id = manager.create_sheet(COLUMNS)
+    for row in range(rows):
+        for column in ("A", "B", "C"):
+            manager.set_cell(sheet_id, row, column, f"{column}{row}")
+        manager.set_cell(sheet_id, row, "D", f"lookup(A,{row})")
+    return sheet_id
+
+
+def chained_sheet(manager: SheetManager, depth: int) -> str:
+    """
+    Create a sheet whose column A holds a lookup chain of the given depth.
+    :param manager: The sheet manager.
+    :param depth: Number of lookups between the head and the value.
+    :return: Sheet ID.
+    """
+    sheet_id = manager.create_sheet(COLUMNS)
+    manager.set_cell(sheet_id, depth, "A", "value")
+    for row in range(depth - 1, -1, -1):
+        manager.set_cell(sheet_id, row, "A", f"lookup(A,{row + 1})")
+    return sheet_id
+
+
+def fan_in_sheet(manager: SheetManager, fan_in: int) -> str:
+    """
+    Create a sheet where many cells look up the same cell.
+    :param manager: The sheet manager.
+    :param fan_in: Number of lookups referencing cell (A, 0).
+    :return: Sheet ID.
+    """
+    sheet_id = manager.create_sheet(COLUMNS)
+    manager.set_cell(sheet_id, 0, "A", "value")
+    for row in range(1, fan_in + 1):
+        manager.set_cell(sheet_id, row, "B", "lookup(A,0)")
+    return sheet_id
+
+
+def run(sizes: List[int], depths: List[int], fan_ins: List[int], repeat: int) -> Dict:
+    """
+    Run all microbenchmarks.
+    :param sizes: Sheet sizes in rows.
+    :param depths: Lookup chain depths.
+    :param fan_ins: Numbers of lookups referencing one cell.
+    :param repeat: Number of timed rounds per benchmark.
+    :return: Benchmark name -> timings.
+    """
+    manager = SheetManager()
+    results: Dict[str, Dict[str, float]] = {}
+
+    for rows in sizes:
+        sheet_id = filled_sheet(manager, rows)
+        sheet = manager.sheets[sheet_id]
+        results[f"get_sheet[rows={rows}]"] = timeit(
+            lambda: manager.get_sheet(sheet_id), repeat, max(1, 2000 // rows)
+        )
+        results[f"set_cell[rows={rows}]"] = timeit(
+            alternating_writes(manager, sheet_id, rows // 2, "B"), repeat, 1000
+        )
+        results[f"lookup_value[rows={rows}]"] = timeit(
+            lambda: manager.lookup_value(sheet, "D", 0, "lookup(A,0)", set()),
+            repeat,
+            1000,
+        )
+
+    for depth in depths:
+        sheet_id = chained_sheet(manager, depth)
+        sheet = manager.sheets[sheet_id]
+        results[f"lookup_value[depth={depth}]"] = timeit(
+            lambda: manager.lookup_value(sheet, "A", 0, sheet.data[0]["A"], set()),
+            repeat,
+            max(1, 10000 // depth),
+        )
+        results[f"set_cell[depth={depth}]"] = timeit(
+            alternating_writes(manager, sheet_id, depth, "A"),
+            repeat,
+            max(1, 1000 // depth),
+        )
+
+    for fan_in in fan_ins:
+        sheet_id = fan_in_sheet(manager, fan_in)
+        results[f"set_cell[fan_in={fan_in}]"] = timeit(
+            alternating_writes(manager, sheet_id, 0, "A"),
+            repeat,
+            max(1, 1000 // fan_in),
+        )
+        results[f"get_sheet[fan_in={fan_in}]"] = timeit(
+            lambda: manager.get_sheet(sheet_id), repeat, max(1, 2000 // fan_in)
+        )
+
+    for rows in sizes:
+        sheet_id = filled_sheet(manager, rows)
+        results[f"read_response[rows={rows},codec=model]"] = timeit(
+            lambda: model_response(manager, sheet_id), repeat, max(1, 2000 // rows)
+        )
+        results[f"read_response[rows={rows},codec=fast]"] = timeit(
+            lambda: encode_sheet(manager.resolve_sheet(sheet_id)),
+            repeat,
+            max(1, 2000 // rows),
+        )
+
+    body = b'{"row": 10, "column": "A", "value": "hello", "expectedVersion": 3}'
+    results["decode_set_cell[codec=model]"] = timeit(
+        lambda: SetCellRequest.model_validate(json.loads(body)), repeat, 10000
+    )
+    results["decode_set_cell[codec=fast]"] = timeit(
+        lambda: decode_set_cell(body), repeat, 10000
+    )
+
+    return results
+
+
+def model_response(manager: SheetManager, sheet_id: str) -> bytes:
+    """
+    Render a sheet the way a pydantic model returned from a route is rendered.
+    :param manager: The sheet manager.
+    :param sheet_id: Sheet ID.
+    :return: JSON bytes.
+    """
+    sheet = SheetSchema(**manager.resolve_sheet(sheet_id))
+    content = jsonable_encoder(sheet.model_dump())
+    return json.dumps(content, separators=(",", ":")).encode()
+
+
+def main() -> None:
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-o", "--output", default="-", help="JSON output file")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--fan-ins", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.depths, args.fan_ins, args.repeat)
+    write_results(args.output, "micro", results)
+
+
+if __name__ == "__main__":
+    main()
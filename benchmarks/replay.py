@@ -0,0 +1,233 @@
+"""
+Replay recorded traffic against a local server.
+
+Record with SHEET_RECORD_PATH=traffic.jsonl set on the server, then:
+
+    python -m benchmarks.replay traffic.jsonl --speed 1 -o replay.json
+    python -m benchmarks.replay traffic.jsonl --speed 0  # as fast as possible
+
+Sheets created in the recording are created again and their new IDs are
+substituted in the paths and JSON bodies of later requests. Server sessions that appended to the same log
+are replayed one after the other, without the idle time between them.
+Responses whose status differs from the recorded one are counted per endpoint
+as status_mismatches.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.load import endpoint_name, free_port, start_server
+from benchmarks.results import percentiles, write_results
+
+
+def load_log(path: str) -> List[Dict[str, Any]]:
+    """
+    Read a traffic log.
+    :param path: JSON Lines file written by RecordingMiddleware.
+    :return: Entries ordered by session and time, each with "t", its offset in
+        seconds from the start of the replay.
+    """
+    sessions: Dict[str, List[Dict[str, Any]]] = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                sessions.setdefault(entry["session"], []).append(entry)
+
+    entries = []
+    offset = 0.0
+    for session in sessions.values():
+        session.sort(key=lambda entry: entry["ts"])
+        start = session[0]["ts"]
+        for entry in session:
+            entry["t"] = offset + entry["ts"] - start
+        offset = session[-1]["t"]
+        entries.extend(session)
+    return entries
+
+
+def recorded_sheet_id(entry: Dict[str, Any]) -> Optional[str]:
+    """
+    Get the ID of the sheet a recorded request created, if any.
+    """
+    try:
+        return json.loads(entry["response"])["sheetId"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class Replayer:
+    """
+    Sends recorded requests, remapping recorded sheet IDs to the new ones.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, concurrency: int) -> None:
+        """
+        Initialize the replayer.
+        :param client: HTTP client bound to the target server.
+        :param concurrency: Maximum number of requests in flight.
+        """
+        self.client = client
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.sheet_ids: Dict[str, "asyncio.Future[str]"] = {}
+        self.latencies: Dict[str, List[float]] = {}
+        self.status_mismatches: Dict[str, int] = {}
+
+    def expect(self, entry: Dict[str, Any]) -> Optional["asyncio.Future[str]"]:
+        """
+        Register the sheet a request will create before it is sent, so later
+        requests wait for its new ID.
+        """
+        sheet_id = recorded_sheet_id(entry)
+        if sheet_id is None:
+            return None
+
+        future: "asyncio.Future[str]" = asyncio.get_running_loop().create_future()
+        self.sheet_ids[sheet_id] = future
+        return future
+
+    async def remap(self, value: Any) -> Any:
+        """
+        Replace recorded sheet IDs anywhere in a JSON body, such as the sheet
+        list of a batch get, with the IDs of the replayed sheets.
+        :param value: Decoded JSON value.
+        :return: The value with sheet IDs replaced.
+        """
+        if isinstance(value, str) and value in self.sheet_ids:
+            return await self.sheet_ids[value]
+        if isinstance(value, list):
+            return [await self.remap(item) for item in value]
+        if isinstance(value, dict):
+            return {key: await self.remap(item) for key, item in value.items()}
+        return value
+
+    async def send(
+        self, entry: Dict[str, Any], created: Optional["asyncio.Future[str]"]
+    ) -> None:
+        """
+        Replay one request.
+        :param entry: The recorded request.
+        :param created: Future for the ID of the sheet this request creates.
+        :return: None
+        """
+        parts = entry["path"].split("/")
+        for i, part in enumerate(parts):
+            if part in self.sheet_ids:
+                parts[i] = await self.sheet_ids[part]
+        path = "/".join(parts)
+        if entry["query"]:
+            path += "?" + entry["query"]
+
+        content = entry["body"].encode()
+        try:
+            payload = json.loads(entry["body"]) if entry["body"] else None
+        except ValueError:
+            payload = None
+        if payload is not None:
+            remapped = await self.remap(payload)
+            if remapped != payload:
+                content = json.dumps(remapped).encode()
+
+        async with self.semaphore:
+            start = time.perf_counter()
+            response = await self.client.request(
+                entry["method"],
+                path,
+                content=content,
+                headers={"content-type": "application/json"},
+            )
+            elapsed = time.perf_counter() - start
+
+        name = endpoint_name(entry["method"], entry["path"])
+        self.latencies.setdefault(name, []).append(elapsed)
+        # A status of 0 means the recorded request failed before responding
+        mismatch = entry["status"] != 0 and response.status_code != entry["status"]
+        self.status_mismatches[name] = self.status_mismatches.get(name, 0) + int(
+            mismatch
+        )
+        if created is not None:
+            try:
+                created.set_result(response.json()["sheetId"])
+            except (ValueError, KeyError):
+                created.set_exception(RuntimeError(f"Could not replay {path}."))
+
+
+async def run(
+    path: str, url: Optional[str], speed: float, concurrency: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    Replay a traffic log.
+    :param path: Traffic log.
+    :param url: Target server, or None to start a local one.
+    :param speed: Pacing multiplier, 1 for the original pacing, 0 for max speed.
+    :param concurrency: Maximum number of requests in flight.
+    :return: Endpoint name -> latency percentiles.
+    """
+    entries = load_log(path)
+    process = None
+    if url is None:
+        port = free_port()
+        process = await start_server(port)
+        url = f"http://127.0.0.1:{port}"
+
+    try:
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+            replayer = Replayer(client, concurrency)
+            tasks = []
+            start = time.perf_counter()
+            for entry in entries:
+                if speed > 0:
+                    delay = entry["t"] / speed - (time.perf_counter() - start)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                created = replayer.expect(entry)
+                tasks.append(asyncio.create_task(replayer.send(entry, created)))
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - start
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    return {
+        name: {
+            **percentiles(samples),
+            "rps": len(samples) / elapsed,
+            "status_mismatches": replayer.status_mismatches[name],
+        }
+        for name, samples in replayer.latencies.items()
+    }
+
+
+def main() -> None:
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("log", help="Traffic log recorded by the server")
+    parser.add_argument("-o", "--output", default="-", help="JSON output file")
+    parser.add_argument("--url", help="Target server instead of a local one")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.log, args.url, args.speed, args.concurrency))
+    for name, result in results.items():
+        if result["status_mismatches"]:
+            print(
+                f"{name}: {result['status_mismatches']} of {result['count']}"
+                " responses differ from the recorded status",
+                file=sys.stderr,
+            )
+    write_results(args.output, "replay", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import json
+import platform
+import subprocess
+import time
+from typing import Any, Dict, List
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """
+    Summarize latency samples.
+    :param samples: Latencies in seconds.
+    :return: Count, mean and p50/p95/p99 in milliseconds.
+    """
+    if not samples:
+        return {"count": 0}
+
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+    }
+
+
+def metadata() -> Dict[str, Any]:
+    """
+    Describe the environment a benchmark ran in.
+    :return: Commit, Python version, platform and timestamp.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def write_results(path: str, kind: str, results: Dict[str, Dict[str, float]]) -> None:
+    """
+    Write benchmark results as JSON.
+    :param path: Output file, or "-" for stdout.
+    :param kind: Benchmark kind.
+    :param results: Benchmark name -> metrics.
+    :return: None
+    """
+    payload = json.dumps(
+        {"kind": kind, "meta": metadata(), "results": results}, indent=2
+    )
+    if path == "-":
+        print(payload)
+        return
+
+    with open(path, "w") as f:
+        f.write(payload + "\n")
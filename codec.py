@@ -0,0 +1,70 @@
+import json
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+
+from models import SetCellRequest
+
+# Pre-rendered body of a successful write, filled in with the cell version
+SUCCESS = b'{"status":"success","version":%d}'
+
+
+def decode_set_cell(body: bytes) -> Tuple[int, str, Any, Optional[int]]:
+    """
+    Decode a set cell request body.
+    Well-formed bodies are checked by hand; anything else goes through
+    SetCellRequest so errors and coercions match the pydantic model.
+    :param body: Raw request body.
+    :return: Row, column, value and expected version.
+    :raises RequestValidationError: If the body does not match SetCellRequest.
+    """
+    try:
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        # orjson rejects integers beyond 64 bits, which json accepts
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            raise RequestValidationError(
+                [
+                    {
+                        "type": "json_invalid",
+                        "loc": ("body", 0),
+                        "msg": "JSON decode error",
+                        "input": {},
+                        "ctx": {"error": str(e)},
+                    }
+                ]
+            )
+
+    if isinstance(payload, dict) and "value" in payload:
+        row = payload.get("row")
+        column = payload.get("column")
+        expected_version = payload.get("expectedVersion")
+        if (
+            type(row) is int
+            and type(column) is str
+            and (expected_version is None or type(expected_version) is int)
+        ):
+            return row, column, payload["value"], expected_version
+
+    try:
+        request = SetCellRequest.model_validate(payload)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False), body=payload)
+    return request.row, request.column, request.value, request.expected_version
+
+
+def encode_sheet(sheet: Dict[str, Any]) -> bytes:
+    """
+    Encode a resolved sheet straight to JSON.
+    :param sheet: Resolved sheet as returned by SheetManager.resolve_sheet.
+    :return: JSON bytes.
+    """
+    try:
+        return orjson.dumps(sheet, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # orjson only encodes 64-bit integers
+        return json.dumps(sheet, separators=(",", ":")).encode()
@@ -1,11 +1,18 @@
+import os
+
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 
+from recording import RecordingMiddleware
 from routers import sheet
 
 app = FastAPI(redirect_slashes=False)
 
+# Capture incoming requests for replay when a log file is configured
+if os.getenv("SHEET_RECORD_PATH"):
+    app.add_middleware(RecordingMiddleware, path=os.environ["SHEET_RECORD_PATH"])
+
 app.include_router(sheet.router, prefix="/api/v1", tags=["sheets"])
 
 
@@ -1,6 +1,7 @@
-from typing import Any, Dict, List
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
 
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
 
 
 class ColumnSchema(BaseModel):
@@ -59,6 +60,18 @@ class SheetSchema(BaseModel):
     id: str
     columns: List[ColumnSchema]
     data: Dict[int, Dict[str, Any]] = {}
+    version: int = 0
+    # Version at which each cell was last written, laid out like data
+    versions: Dict[int, Dict[str, int]] = {}
+
+    # Reverse lookup index: referenced (column, row) -> cells that look it up
+    _dependents: Dict[Tuple[str, int], Set[Tuple[str, int]]] = PrivateAttr(
+        default_factory=dict
+    )
+    # Bounded log of (version, row, column, resolved value) cell changes
+    _changes: Deque[Tuple[int, int, str, Any]] = PrivateAttr(default_factory=deque)
+    # Changes up to this version may have been evicted from the log
+    _log_floor: int = PrivateAttr(default=0)
 
     def validate_value(self, column: str, value: Any) -> None:
         """
@@ -91,3 +104,23 @@ class SetCellRequest(BaseModel):
     row: int
     column: str
     value: Any
+    expected_version: Optional[int] = Field(default=None, alias="expectedVersion")
+
+
+class SheetWindow(BaseModel):
+    """
+    A sheet to read, optionally restricted to a window of rows and columns.
+    """
+
+    id: str
+    rows: Optional[Tuple[int, int]] = None
+    columns: Optional[List[str]] = None
+
+
+class BatchGetRequest(BaseModel):
+    """
+    Request schema for reading several sheets at once.
+    """
+
+    sheets: List[SheetWindow]
+    versions: bool = False
@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+from typing import Any, Dict, List
+from uuid import uuid4
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Responses up to this size are recorded, so replays can map created sheet IDs
+MAX_RECORDED_RESPONSE = 256
+
+
+class RecordingMiddleware:
+    """
+    Appends every HTTP request to a JSON Lines log for later replay.
+    Each line holds the server session, the wall-clock time, the method, path,
+    query string, body, response status and, for small responses, the response
+    body. Several server runs can append to the same log, their entries are
+    told apart by session.
+    """
+
+    def __init__(self, app: ASGIApp, path: str) -> None:
+        """
+        Initialize the middleware.
+        :param app: The wrapped application.
+        :param path: Log file to append to.
+        """
+        self.app = app
+        self.log = open(path, "a", buffering=1)
+        self.lock = threading.Lock()
+        self.session = uuid4().hex[:12]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Record an HTTP request and its response.
+        """
+        if scope["type"] == "lifespan":
+            await self.app(scope, receive, self._closing_send(send))
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.time()
+        body: List[bytes] = []
+        response: List[bytes] = []
+        status = 0
+
+        async def recording_receive() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                body.append(message.get("body", b""))
+            return message
+
+        async def recording_send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                if sum(map(len, response)) <= MAX_RECORDED_RESPONSE:
+                    response.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, recording_receive, recording_send)
+        finally:
+            self.record(
+                {
+                    "session": self.session,
+                    "ts": round(started, 6),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": scope["query_string"].decode("latin-1"),
+                    "body": b"".join(body).decode("utf-8", "replace"),
+                    "status": status,
+                    "response": _small_response(b"".join(response)),
+                }
+            )
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        """
+        Append an entry to the log.
+        :param entry: The entry.
+        :return: None
+        """
+        line = json.dumps(entry, separators=(",", ":"))
+        with self.lock:
+            if not self.log.closed:
+                self.log.write(line + "\n")
+
+    def close(self) -> None:
+        """
+        Close the log.
+        :return: None
+        """
+        with self.lock:
+            self.log.close()
+
+    def _closing_send(self, send: Send) -> Send:
+        """
+        Wrap the lifespan send channel to close the log on server shutdown.
+        """
+
+        async def closing_send(message: Message) -> None:
+            if message["type"] == "lifespan.shutdown.complete":
+                self.close()
+            await send(message)
+
+        return closing_send
+
+
+def _small_response(body: bytes) -> str:
+    """
+    Keep a response body only if it is small enough to be worth recording.
+    """
+    if len(body) > MAX_RECORDED_RESPONSE:
+        return ""
+    return body.decode("utf-8", "replace")
@@ -1,13 +1,33 @@
-from typing import Any, Dict
+import asyncio
+from typing import Any, AsyncIterator, Dict, List
 
-from fastapi import APIRouter, HTTPException
+import orjson
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from pydantic import ValidationError
 
-from models import SetCellRequest, SheetCreateRequest
-from service import SheetManager
+from codec import SUCCESS, decode_set_cell, encode_sheet
+from models import (
+    BatchGetRequest,
+    SetCellRequest,
+    SheetCreateRequest,
+    SheetWindow,
+)
+from service import SheetManager, VersionConflictError
+from subscriptions import SheetSubscriptions, Subscriber
 
 router = APIRouter()
 manager = SheetManager()
+subscriptions = SheetSubscriptions()
 
 
 @router.post("/sheet/")
@@ -25,29 +45,185 @@ async def create_sheet(request: SheetCreateRequest) -> Dict[str, str]:
 
 
 @router.get("/sheet/{sheet_id}")
-async def get_sheet(sheet_id: str) -> Any:
+async def get_sheet(sheet_id: str, versions: bool = False) -> Response:
     """
     Get a sheet by ID.
     :param sheet_id:
+    :param versions: Include the per-cell versions.
     :return:
     """
     try:
-        sheet = manager.get_sheet(sheet_id)
-        return sheet.model_dump()
+        sheet = manager.resolve_sheet(sheet_id, include_versions=versions)
     except KeyError:
         raise HTTPException(status_code=404, detail="Sheet not found.")
 
+    return Response(content=encode_sheet(sheet), media_type="application/json")
 
-@router.post("/sheet/{sheet_id}/set")
-async def set_cell(sheet_id: str, request: SetCellRequest) -> Dict[str, str]:
+
+@router.post("/sheets/batch-get")
+async def batch_get_sheets(request: BatchGetRequest) -> StreamingResponse:
+    """
+    Get several sheets at once, each optionally restricted to a window.
+    Sheets are resolved concurrently in worker threads, each under the manager
+    lock for its own resolution only, and streamed in request order as one
+    {"sheets": [...]} document. Unknown sheets are returned as
+    {"id": ..., "error": ...} entries.
+    :param request: Batch get request.
+    :return:
+    """
+    return StreamingResponse(
+        _stream_sheets(request.sheets, request.versions),
+        media_type="application/json",
+    )
+
+
+async def _stream_sheets(
+    windows: List[SheetWindow], include_versions: bool
+) -> AsyncIterator[bytes]:
+    """
+    Resolve sheets concurrently and yield them as one JSON document.
+    :param windows: Sheets to resolve.
+    :param include_versions: Include the per-cell versions.
+    :return: JSON chunks.
+    """
+    tasks = [
+        asyncio.ensure_future(
+            asyncio.to_thread(_encode_window, window, include_versions)
+        )
+        for window in windows
+    ]
+    try:
+        yield b'{"sheets":['
+        for i, task in enumerate(tasks):
+            if i:
+                yield b","
+            yield await task
+        yield b"]}"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _encode_window(window: SheetWindow, include_versions: bool) -> bytes:
+    """
+    Resolve and encode one sheet of a batch.
+    :param window: Sheet to resolve.
+    :param include_versions: Include the per-cell versions.
+    :return: JSON bytes.
+    """
+    try:
+        sheet = manager.resolve_sheet(
+            window.id, window.rows, window.columns, include_versions
+        )
+    except KeyError:
+        return orjson.dumps({"id": window.id, "error": "Sheet not found."})
+    return encode_sheet(sheet)
+
+
+@router.get("/sheet/{sheet_id}/changes")
+async def get_changes(sheet_id: str, since: int = Query(ge=0)) -> Dict[str, Any]:
+    """
+    Get the cell changes of a sheet since a version.
+    :param sheet_id: Sheet ID.
+    :param since: Last version the client has seen.
+    :return: The changed cells, or a resync flag if the client fell too far
+        behind the change log and has to fetch the whole sheet.
+    """
+    try:
+        version, changes = manager.get_changes(sheet_id, since)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Sheet not found.")
+
+    if changes is None:
+        return {"version": version, "resync": True}
+
+    return {
+        "version": version,
+        "changes": [
+            {"version": v, "row": row, "column": column, "value": value}
+            for v, row, column, value in changes
+        ],
+    }
+
+
+@router.post(
+    "/sheet/{sheet_id}/set",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": SetCellRequest.model_json_schema()}
+            },
+        }
+    },
+)
+async def set_cell(sheet_id: str, request: Request) -> Response:
     """
     Set a cell value.
+    The body is a SetCellRequest, decoded without building the pydantic model.
     :param sheet_id: Sheet ID.
     :param request: Set cell request.
     :return:
     """
+    row, column, value, expected_version = decode_set_cell(await request.body())
     try:
-        manager.set_cell(sheet_id, request.row, request.column, request.value)
-        return {"status": "success"}
+        version, changes = manager.set_cell(
+            sheet_id, row, column, value, expected_version=expected_version
+        )
+    except VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except (KeyError, ValueError, TypeError) as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+    subscriptions.publish(sheet_id, changes)
+    return Response(content=SUCCESS % version, media_type="application/json")
+
+
+@router.websocket("/ws/sheet/{sheet_id}")
+async def sheet_updates(
+    websocket: WebSocket, sheet_id: str, versions: bool = False
+) -> None:
+    """
+    Push the changed cells of a sheet after each write.
+    The first message is a full snapshot of the sheet, followed by "cells"
+    messages holding only the cells whose resolved values changed.
+    :param websocket: The websocket connection.
+    :param sheet_id: Sheet ID.
+    :param versions: Include the per-cell versions in the snapshot.
+    :return: None
+    """
+    if sheet_id not in manager.sheets:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    # Subscribe before taking the snapshot so no write falls in between
+    subscriber = subscriptions.subscribe(sheet_id)
+    try:
+        sheet = manager.resolve_sheet(sheet_id, include_versions=versions)
+        await websocket.send_json({"type": "snapshot", "sheet": sheet})
+
+        sender = asyncio.create_task(_forward(websocket, subscriber))
+        try:
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            sender.cancel()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        subscriptions.unsubscribe(subscriber)
+
+
+async def _forward(websocket: WebSocket, subscriber: Subscriber) -> None:
+    """
+    Forward queued messages of a subscriber to its websocket.
+    :param websocket: The websocket connection.
+    :param subscriber: The subscriber.
+    :return: None
+    """
+    try:
+        while True:
+            await websocket.send_json(await subscriber.queue.get())
+    except (WebSocketDisconnect, RuntimeError):
+        pass
@@ -1,21 +1,51 @@
+import os
+import sys
 import threading
-from typing import Any, Dict, List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import uuid4
 
 from models import ColumnSchema, SheetSchema
 
+# Sentinel for cells that have no value yet
+_MISSING = object()
+
+# Threads only resolve in parallel when the interpreter runs without the GIL
+FREE_THREADED = not getattr(sys, "_is_gil_enabled", lambda: True)()
+
+
+class VersionConflictError(ValueError):
+    """
+    Raised when a conditional write finds a different cell version than expected.
+    """
+
 
 class SheetManager:
     """
     Manages sheets.
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        change_log_size: int = 1024,
+        parallel: bool = FREE_THREADED,
+        parallel_threshold: int = 10000,
+    ) -> None:
         """
         Initialize the sheet manager.
+        :param change_log_size: Number of cell changes each sheet keeps for
+            incremental sync.
+        :param parallel: Resolve independent lookup components in worker threads.
+        :param parallel_threshold: Minimum number of lookups in a read before it
+            is resolved in parallel.
         """
         self.sheets: Dict[str, SheetSchema] = {}
         self.lock = threading.Lock()
+        self.change_log_size = change_log_size
+        self.parallel = parallel
+        self.parallel_threshold = parallel_threshold
+        self._executor: Optional[ThreadPoolExecutor] = None
 
     def create_sheet(self, columns: List[ColumnSchema]) -> str:
         """
@@ -25,7 +55,9 @@ class SheetManager:
         """
         with self.lock:
             sheet_id = str(uuid4())
-            self.sheets[sheet_id] = SheetSchema(id=sheet_id, columns=columns)
+            sheet = SheetSchema(id=sheet_id, columns=columns)
+            sheet._changes = deque(maxlen=self.change_log_size)
+            self.sheets[sheet_id] = sheet
             return sheet_id
 
     def get_sheet(self, sheet_id: str) -> SheetSchema:
@@ -34,49 +66,342 @@ class SheetManager:
         :param sheet_id: Sheet ID.
         :return: The sheet schema.
         """
+        return SheetSchema(**self.resolve_sheet(sheet_id, include_versions=True))
+
+    def resolve_sheet(
+        self,
+        sheet_id: str,
+        rows: Optional[Tuple[int, int]] = None,
+        columns: Optional[List[str]] = None,
+        include_versions: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Get a sheet by ID with its lookups resolved, as plain data that can be
+        encoded without another round of validation.
+        :param sheet_id: Sheet ID.
+        :param rows: Only include rows in [start, end).
+        :param columns: Only include these columns.
+        :param include_versions: Include the per-cell versions.
+        :return: The sheet in the shape of SheetSchema.model_dump(), without
+            "versions" unless requested.
+        """
         with self.lock:
             if sheet_id not in self.sheets:
                 raise KeyError(f"Sheet {sheet_id} not found.")
 
             sheet = self.sheets[sheet_id]
-            resolved_data = {}
+            wanted = set(columns) if columns is not None else None
+            resolved_data: Dict[int, Dict[str, Any]] = {}
+            versions = {}
+            lookups = []
             for row, row_data in sheet.data.items():
+                if rows is not None and not rows[0] <= row < rows[1]:
+                    continue
+
                 resolved_row = {}
                 for column, value in row_data.items():
-                    resolved_row[column] = self.lookup_value(
-                        sheet, column, row, value, visited=set()
+                    if wanted is None or column in wanted:
+                        # Lookups are overwritten in place once resolved
+                        resolved_row[column] = value
+                        if isinstance(value, str) and value.startswith("lookup("):
+                            lookups.append((column, row))
+                if resolved_row:
+                    resolved_data[row] = resolved_row
+                    if include_versions:
+                        row_versions = sheet.versions.get(row, {})
+                        versions[row] = {c: row_versions[c] for c in resolved_row}
+
+            if self.parallel and len(lookups) >= self.parallel_threshold:
+                self._resolve_parallel(sheet, lookups, resolved_data)
+            else:
+                self._resolve_lookups(sheet, lookups, resolved_data)
+
+            resolved = {
+                "id": sheet.id,
+                "columns": [column.model_dump() for column in sheet.columns],
+                "data": resolved_data,
+                "version": sheet.version,
+            }
+            if include_versions:
+                resolved["versions"] = versions
+            return resolved
+
+    def _resolve_lookups(
+        self,
+        sheet: SheetSchema,
+        cells: List[Tuple[str, int]],
+        out: Dict[int, Dict[str, Any]],
+    ) -> None:
+        """
+        Resolve lookup cells into the resolved rows, sharing the work of common
+        chain suffixes.
+        :param sheet: The sheet schema.
+        :param cells: (column, row) of the lookups to resolve.
+        :param out: Resolved rows to write into.
+        :return: None
+        :raises ValueError: If a stored lookup chain is cyclic.
+        """
+        data = sheet.data
+        memo: Dict[Tuple[str, int], Any] = {}
+        for cell in cells:
+            chain = []
+            on_chain = set()
+            current = cell
+            while current not in memo:
+                column, row = current
+                value = data[row][column]
+                ref = self.lookup_reference(value)
+                if ref is None or ref[1] not in data or ref[0] not in data[ref[1]]:
+                    memo[current] = value
+                    break
+                if ref in on_chain or ref == current:
+                    raise ValueError(
+                        f"Cycle detected involving cell ({column}, {row})."
                     )
-                resolved_data[row] = resolved_row
+                chain.append(current)
+                on_chain.add(current)
+                current = ref
 
-            # Return a copy of the SheetSchema object with resolved data
-            return SheetSchema(id=sheet.id, columns=sheet.columns, data=resolved_data)
+            result = memo[current]
+            for link in chain:
+                memo[link] = result
+            out[cell[1]][cell[0]] = result
 
-    def set_cell(self, sheet_id: str, row: int, column: str, value: Any) -> None:
+    def _resolve_parallel(
+        self,
+        sheet: SheetSchema,
+        cells: List[Tuple[str, int]],
+        out: Dict[int, Dict[str, Any]],
+    ) -> None:
+        """
+        Split lookups into independent components of the lookup graph and
+        resolve them in worker threads, each writing into the resolved rows.
+        :param sheet: The sheet schema.
+        :param cells: (column, row) of the lookups to resolve.
+        :param out: Resolved rows to write into.
+        :return: None
+        """
+        workers = os.cpu_count() or 1
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(workers)
+
+        # Balance components over the workers, largest first
+        buckets: List[List[Tuple[str, int]]] = [[] for _ in range(workers)]
+        for component in sorted(self.components(sheet, cells), key=len, reverse=True):
+            min(buckets, key=len).extend(component)
+
+        futures = [
+            self._executor.submit(self._resolve_lookups, sheet, bucket, out)
+            for bucket in buckets
+            if bucket
+        ]
+        for future in wait(futures).done:
+            future.result()
+
+    def components(
+        self, sheet: SheetSchema, cells: List[Tuple[str, int]]
+    ) -> List[List[Tuple[str, int]]]:
+        """
+        Group lookup cells into connected components of the lookup graph.
+        Cells in different components never share a lookup chain.
+        :param sheet: The sheet schema.
+        :param cells: (column, row) of lookup cells.
+        :return: The cells grouped by component.
+        """
+        parent: Dict[Tuple[str, int], Tuple[str, int]] = {}
+
+        def find(cell: Tuple[str, int]) -> Tuple[str, int]:
+            root = cell
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while cell != root:
+                parent[cell], cell = root, parent[cell]
+            return root
+
+        for column, row in cells:
+            current = (column, row)
+            while True:
+                ref = self.lookup_reference(sheet.data[current[1]][current[0]])
+                if ref is None or ref[0] not in sheet.data.get(ref[1], {}):
+                    break
+                a, b = find(current), find(ref)
+                if a == b:
+                    break
+                parent[a] = b
+                current = ref
+
+        groups: Dict[Tuple[str, int], List[Tuple[str, int]]] = {}
+        for cell in cells:
+            groups.setdefault(find(cell), []).append(cell)
+        return list(groups.values())
+
+    def set_cell(
+        self,
+        sheet_id: str,
+        row: int,
+        column: str,
+        value: Any,
+        expected_version: Optional[int] = None,
+    ) -> Tuple[int, List[Tuple[int, int, str, Any]]]:
         """
         Set a cell value.
         :param sheet_id: Sheet ID.
         :param row: Row index.
         :param column: Column name.
         :param value: Value to set.
-        :return: None
+        :param expected_version: If given, only write when the cell is still at
+            this version (0 for a cell that was never written).
+        :return: The new version of the cell, and (version, row, column,
+            resolved value) of every cell whose resolved value changed, including
+            lookups that depend on the written cell.
         """
         with self.lock:
             sheet = self.sheets.get(sheet_id, None)
             if not sheet:
                 raise KeyError(f"Sheet {sheet_id} not found.")
 
-            # Detect cycles
+            if expected_version is not None:
+                current = sheet.versions.get(row, {}).get(column, 0)
+                if current != expected_version:
+                    raise VersionConflictError(
+                        f"Cell ({column}, {row}) is at version {current},"
+                        f" expected {expected_version}."
+                    )
+
+            # Detect cycles, the chain never passes through this cell so it also
+            # gives the resolved value after the write
+            new = value
             if isinstance(value, str) and value.startswith("lookup("):
                 try:
-                    self.lookup_value(sheet, column, row, value, visited=set())
+                    new = self.lookup_value(sheet, column, row, value, visited=set())
                 except ValueError as e:
                     raise ValueError(f"Invalid lookup function: {e}")
 
             # If no cycles, proceed to set the cell value
             sheet.validate_value(column, value)
+            old = self.resolve_cell(sheet, column, row)
+
+            # Nothing below raises, so the sheet is never left half-updated
+            self._unlink(sheet, column, row)
             if row not in sheet.data:
                 sheet.data[row] = {}
             sheet.data[row][column] = value
+            self._link(sheet, column, row)
+
+            sheet.version += 1
+            sheet.versions.setdefault(row, {})[column] = sheet.version
+            changes = []
+            # Every dependent resolves through this cell, so they all change
+            # together with it and to the same value
+            if old is _MISSING or type(old) is not type(new) or old != new:
+                changes = [
+                    (sheet.version, dependent_row, dependent_column, new)
+                    for dependent_column, dependent_row in self.dependents(
+                        sheet, column, row
+                    )
+                ]
+
+            log = sheet._changes
+            if log.maxlen is not None:
+                evicted = len(log) + len(changes) - log.maxlen
+                if evicted > 0:
+                    # Changes up to the newest evicted one are no longer covered,
+                    # all of this write's changes share its version
+                    sheet._log_floor = (
+                        log[evicted - 1][0] if evicted <= len(log) else sheet.version
+                    )
+            log.extend(changes)
+            return sheet.version, changes
+
+    def get_changes(
+        self, sheet_id: str, since: int
+    ) -> Tuple[int, Optional[List[Tuple[int, int, str, Any]]]]:
+        """
+        Get the cell changes made after a version of a sheet.
+        :param sheet_id: Sheet ID.
+        :param since: Last version the caller has seen.
+        :return: The current version and the latest change of every cell changed
+            since then, or None if those changes are no longer in the change log
+            and the caller has to fetch the whole sheet again.
+        """
+        with self.lock:
+            sheet = self.sheets.get(sheet_id, None)
+            if not sheet:
+                raise KeyError(f"Sheet {sheet_id} not found.")
+
+            if since < sheet._log_floor or since > sheet.version:
+                return sheet.version, None
+
+            latest: Dict[Tuple[int, str], Tuple[int, int, str, Any]] = {}
+            for change in reversed(sheet._changes):
+                if change[0] <= since:
+                    break
+                latest.setdefault((change[1], change[2]), change)
+            return sheet.version, list(reversed(latest.values()))
+
+    def dependents(
+        self, sheet: SheetSchema, column: str, row: int
+    ) -> List[Tuple[str, int]]:
+        """
+        Collect a cell and every lookup cell that transitively depends on it.
+        :param sheet: The sheet schema.
+        :param column: The column of the cell.
+        :param row: The row of the cell.
+        :return: List of (column, row) tuples, starting with the cell itself.
+        """
+        index = sheet._dependents
+        cells = [(column, row)]
+        seen = set(cells)
+        for cell in cells:
+            for dependent in index.get(cell, ()):
+                if dependent not in seen:
+                    seen.add(dependent)
+                    cells.append(dependent)
+        return cells
+
+    def resolve_cell(self, sheet: SheetSchema, column: str, row: int) -> Any:
+        """
+        Resolve the current value of a stored cell.
+        :param sheet: The sheet schema.
+        :param column: The column of the cell.
+        :param row: The row of the cell.
+        :return: Resolved value, or a sentinel if the cell is empty.
+        """
+        row_data = sheet.data.get(row)
+        if row_data is None or column not in row_data:
+            return _MISSING
+        return self.lookup_value(sheet, column, row, row_data[column], visited=set())
+
+    @staticmethod
+    def lookup_reference(value: Any) -> Optional[Tuple[str, int]]:
+        """
+        Parse the cell referenced by a lookup function.
+        :param value: The value of the cell.
+        :return: (column, row) of the referenced cell, or None for plain values.
+        """
+        if not (isinstance(value, str) and value.startswith("lookup(")):
+            return None
+        args = value[len("lookup(") : -1].split(",")
+        return args[0].strip(), int(args[1].strip())
+
+    def _link(self, sheet: SheetSchema, column: str, row: int) -> None:
+        """
+        Register a cell in the reverse lookup index of the cell it references.
+        """
+        ref = self.lookup_reference(sheet.data[row][column])
+        if ref is not None:
+            sheet._dependents.setdefault(ref, set()).add((column, row))
+
+    def _unlink(self, sheet: SheetSchema, column: str, row: int) -> None:
+        """
+        Remove a cell from the reverse lookup index before it is overwritten.
+        """
+        ref = self.lookup_reference(sheet.data.get(row, {}).get(column))
+        if ref is not None:
+            dependents = sheet._dependents[ref]
+            dependents.discard((column, row))
+            if not dependents:
+                del sheet._dependents[ref]
 
     def lookup_value(
         self, sheet: SheetSchema, column: str, row: int, value: Any, visited: set
@@ -90,28 +415,25 @@ class SheetManager:
         :param visited: Set of visited nodes to prevent cycles.
         :return: Resolved value.
         """
-        try:
-            if isinstance(value, str) and value.startswith("lookup("):
+        # Walk the chain iteratively so deep chains cannot exhaust the stack
+        while isinstance(value, str) and value.startswith("lookup("):
+            try:
                 args = value[len("lookup(") : -1].split(",")
                 ref_column = args[0].strip()
                 ref_row = int(args[1].strip())
+            except IndexError:
+                raise ValueError("Invalid lookup function format.")
 
-                # Instead of going through the entire sheet, we can just check if the
-                # cell is in the visited set
-                if (ref_column, ref_row) in visited:
-                    raise ValueError(
-                        f"Cycle detected involving cell ({column}, {row})."
-                    )
-
-                visited.add((column, row))
+            # Instead of going through the entire sheet, we can just check if the
+            # cell is in the visited set, which includes the cell itself
+            visited.add((column, row))
+            if (ref_column, ref_row) in visited:
+                raise ValueError(f"Cycle detected involving cell ({column}, {row}).")
 
-                if ref_row not in sheet.data or ref_column not in sheet.data[ref_row]:
-                    return value
+            if ref_row not in sheet.data or ref_column not in sheet.data[ref_row]:
+                return value
 
-                return self.lookup_value(
-                    sheet, ref_column, ref_row, sheet.data[ref_row][ref_column], visited
-                )
-        except IndexError:
-            raise ValueError("Invalid lookup function format.")
+            column, row = ref_column, ref_row
+            value = sheet.data[ref_row][ref_column]
 
         return value
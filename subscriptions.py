@@ -0,0 +1,122 @@
+import asyncio
+from typing import Any, Dict, List, Set, Tuple
+
+
+class Subscriber:
+    """
+    A single client subscribed to the cell updates of a sheet.
+    """
+
+    def __init__(self, sheet_id: str, max_queue: int) -> None:
+        """
+        Initialize the subscriber.
+        :param sheet_id: Sheet ID.
+        :param max_queue: Maximum number of undelivered messages.
+        """
+        self.sheet_id = sheet_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(max_queue)
+
+    def push(self, message: Dict[str, Any]) -> None:
+        """
+        Queue a message without ever blocking the publisher.
+        A subscriber that falls behind has its backlog dropped and is told to
+        resync from a full read of the sheet instead.
+        :param message: Message to deliver.
+        :return: None
+        """
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync", "sheetId": self.sheet_id})
+
+
+class SheetSubscriptions:
+    """
+    Fans out cell changes to the subscribers of each sheet.
+    """
+
+    def __init__(self, max_queue: int = 64) -> None:
+        """
+        Initialize the subscriptions registry.
+        :param max_queue: Per-subscriber queue bound.
+        """
+        self.max_queue = max_queue
+        self.subscribers: Dict[str, Set[Subscriber]] = {}
+        self.pending: Dict[str, Dict[Tuple[int, str], Tuple[int, Any]]] = {}
+        self.flush_scheduled = False
+
+    def subscribe(self, sheet_id: str) -> Subscriber:
+        """
+        Subscribe to the cell updates of a sheet.
+        :param sheet_id: Sheet ID.
+        :return: The new subscriber.
+        """
+        subscriber = Subscriber(sheet_id, self.max_queue)
+        self.subscribers.setdefault(sheet_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        """
+        Remove a subscriber.
+        :param subscriber: The subscriber to remove.
+        :return: None
+        """
+        subscribers = self.subscribers.get(subscriber.sheet_id)
+        if subscribers is None:
+            return
+
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self.subscribers[subscriber.sheet_id]
+
+    def publish(self, sheet_id: str, changes: List[Tuple[int, int, str, Any]]) -> None:
+        """
+        Record changed cells and schedule a flush at the end of the current
+        event-loop tick, so that several writes reach subscribers as one message.
+        Must be called from the event loop thread.
+        :param sheet_id: Sheet ID.
+        :param changes: (version, row, column, resolved value) of the changed cells.
+        :return: None
+        """
+        if not changes or sheet_id not in self.subscribers:
+            return
+
+        pending = self.pending.setdefault(sheet_id, {})
+        for version, row, column, value in changes:
+            pending[(row, column)] = (version, value)
+
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+
+    def flush(self) -> None:
+        """
+        Deliver the coalesced changes to every subscriber.
+        :return: None
+        """
+        self.flush_scheduled = False
+        pending, self.pending = self.pending, {}
+        for sheet_id, cells in pending.items():
+            subscribers = self.subscribers.get(sheet_id)
+            if not subscribers:
+                continue
+
+            message = {
+                "type": "cells",
+                "sheetId": sheet_id,
+                "version": max(version for version, _ in cells.values()),
+                "cells": [
+                    {"row": row, "column": column, "value": value}
+                    for (row, column), (_, value) in cells.items()
+                ],
+            }
+            loop = asyncio.get_running_loop()
+            for subscriber in subscribers:
+                if subscriber.loop is loop:
+                    subscriber.push(message)
+                else:
+                    # asyncio queues are not thread-safe, hand over to its loop
+                    subscriber.loop.call_soon_threadsafe(subscriber.push, message)
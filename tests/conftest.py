@@ -1,5 +1,7 @@
 import pytest
+from fastapi.testclient import TestClient
 
+from main import app
 from models import ColumnSchema
 
 
@@ -49,3 +51,13 @@ def invalid_sheet_schema():
             {"name": "A", "type": "invalid_type"},  # Invalid column type
         ]
     }
+
+
+@pytest.fixture
+def create_valid_sheet(valid_sheet_schema):
+    """
+    Creates a valid sheet via the API and returns the sheet ID.
+    """
+    response = TestClient(app).post("/api/v1/sheet/", json=valid_sheet_schema)
+    assert response.status_code == 200
+    return response.json()["sheetId"]
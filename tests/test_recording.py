@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+from benchmarks.replay import Replayer, load_log
+from main import app
+from recording import RecordingMiddleware
+
+
+def test_requests_are_recorded(tmp_path, valid_sheet_schema):
+    """
+    Test that requests and small responses are appended to the traffic log.
+    """
+    log_path = tmp_path / "traffic.jsonl"
+    recorder = RecordingMiddleware(app, path=str(log_path))
+    client = TestClient(recorder)
+
+    sheet_id = client.post("/api/v1/sheet/", json=valid_sheet_schema).json()["sheetId"]
+    client.get(f"/api/v1/sheet/{sheet_id}/changes?since=0")
+    recorder.close()
+
+    entries = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert [entry["method"] for entry in entries] == ["POST", "GET"]
+    assert entries[0]["session"] == entries[1]["session"]
+    assert json.loads(entries[0]["body"]) == valid_sheet_schema
+    assert json.loads(entries[0]["response"]) == {"sheetId": sheet_id}
+    assert entries[1]["path"] == f"/api/v1/sheet/{sheet_id}/changes"
+    assert entries[1]["query"] == "since=0"
+    assert entries[1]["status"] == 200
+
+
+def test_sessions_are_replayed_in_order(tmp_path, valid_sheet_schema):
+    """
+    Test that a log appended to by two server runs replays them one by one.
+    """
+    log_path = tmp_path / "traffic.jsonl"
+    for _ in range(2):
+        recorder = RecordingMiddleware(app, path=str(log_path))
+        with TestClient(recorder) as client:
+            client.post("/api/v1/sheet/", json=valid_sheet_schema)
+            client.get("/")
+        assert recorder.log.closed
+
+    entries = load_log(str(log_path))
+
+    assert [entry["method"] for entry in entries] == ["POST", "GET"] * 2
+    assert entries[0]["session"] != entries[2]["session"]
+    assert [entry["t"] for entry in entries] == sorted(e["t"] for e in entries)
+    assert entries[2]["t"] == entries[1]["t"]
+
+
+def test_replay_remaps_sheet_ids_in_bodies(valid_sheet_schema):
+    """
+    Test that a replayed batch get asks for the replayed sheets, not the recorded.
+    """
+    recorded = TestClient(app).post("/api/v1/sheet/", json=valid_sheet_schema)
+    recorded_id = recorded.json()["sheetId"]
+    entries = [
+        {
+            "t": 0.0,
+            "method": "POST",
+            "path": "/api/v1/sheet/",
+            "query": "",
+            "body": json.dumps(valid_sheet_schema),
+            "status": 200,
+            "response": recorded.text,
+        },
+        {
+            "t": 0.0,
+            "method": "POST",
+            "path": "/api/v1/sheets/batch-get",
+            "query": "",
+            "body": json.dumps({"sheets": [{"id": recorded_id}]}),
+            "status": 200,
+            "response": "",
+        },
+    ]
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            replayer = Replayer(c, concurrency=1)
+            for entry in entries:
+                await replayer.send(entry, replayer.expect(entry))
+            replayed_id = await replayer.sheet_ids[recorded_id]
+            batch = json.loads(entries[1]["body"])
+            return replayed_id, await replayer.remap(batch)
+
+    replayed_id, batch = asyncio.run(scenario())
+
+    assert replayed_id != recorded_id
+    assert batch == {"sheets": [{"id": replayed_id}]}
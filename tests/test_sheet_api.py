@@ -1,21 +1,11 @@
-import pytest
 from fastapi.testclient import TestClient
 
 from main import app
+from routers.sheet import manager
 
 client = TestClient(app)
 
 
-@pytest.fixture
-def create_valid_sheet(valid_sheet_schema):
-    """
-    Creates a valid sheet via the API and returns the sheet ID.
-    """
-    response = client.post("/api/v1/sheet/", json=valid_sheet_schema)
-    assert response.status_code == 200
-    return response.json()["sheetId"]
-
-
 def test_create_sheet_good_call(valid_sheet):
     """
     Test creating a sheet with a valid schema.
@@ -72,7 +62,7 @@ def test_set_cell_good_call(create_valid_sheet):
         json={"row": 10, "column": "A", "value": "hello"},
     )
     assert response.status_code == 200
-    assert response.json() == {"status": "success"}
+    assert response.json() == {"status": "success", "version": 1}
 
     get_response = client.get(f"/api/v1/sheet/{sheet_id}")
     assert get_response.status_code == 200
@@ -105,20 +95,20 @@ def test_big_test_with_sheet_and_data(create_valid_sheet):
         json={"row": 10, "column": "A", "value": "hello"},
     )
     assert set_response_a.status_code == 200
-    assert set_response_a.json() == {"status": "success"}
+    assert set_response_a.json() == {"status": "success", "version": 1}
 
     set_response_b = client.post(
         f"/api/v1/sheet/{sheet_id}/set", json={"row": 11, "column": "B", "value": True}
     )
     assert set_response_b.status_code == 200
-    assert set_response_b.json() == {"status": "success"}
+    assert set_response_b.json() == {"status": "success", "version": 2}
 
     set_response_c = client.post(
         f"/api/v1/sheet/{sheet_id}/set",
         json={"row": 1, "column": "C", "value": "lookup(A,10)"},
     )
     assert set_response_c.status_code == 200
-    assert set_response_c.json() == {"status": "success"}
+    assert set_response_c.json() == {"status": "success", "version": 3}
 
     get_response = client.get(f"/api/v1/sheet/{sheet_id}")
     assert get_response.status_code == 200
@@ -140,14 +130,14 @@ def test_set_cell_cycle_detection(create_valid_sheet):
         json={"row": 1, "column": "C", "value": "lookup(A,1)"},
     )
     assert set_response_a.status_code == 200
-    assert set_response_a.json() == {"status": "success"}
+    assert set_response_a.json() == {"status": "success", "version": 1}
 
     set_response_b = client.post(
         f"/api/v1/sheet/{sheet_id}/set",
         json={"row": 1, "column": "A", "value": "lookup(B,1)"},
     )
     assert set_response_b.status_code == 200
-    assert set_response_b.json() == {"status": "success"}
+    assert set_response_b.json() == {"status": "success", "version": 2}
 
     cycle_response = client.post(
         f"/api/v1/sheet/{sheet_id}/set",
@@ -169,7 +159,7 @@ def test_set_cell_cycle_detection2(create_valid_sheet):
         json={"row": 1, "column": "C", "value": "lookup(A,10)"},
     )
     assert set_response_a.status_code == 200
-    assert set_response_a.json() == {"status": "success"}
+    assert set_response_a.json() == {"status": "success", "version": 1}
 
     set_response_b = client.post(
         f"/api/v1/sheet/{sheet_id}/set",
@@ -178,3 +168,192 @@ def test_set_cell_cycle_detection2(create_valid_sheet):
 
     assert set_response_b.status_code == 400
     assert "Cycle detected" in set_response_b.json()["detail"]
+
+
+def test_get_changes_since_version(create_valid_sheet):
+    """
+    Test fetching only the cells changed after a version.
+    """
+    sheet_id = create_valid_sheet
+    client.post(
+        f"/api/v1/sheet/{sheet_id}/set",
+        json={"row": 1, "column": "C", "value": "lookup(A,10)"},
+    )
+    version = client.get(f"/api/v1/sheet/{sheet_id}").json()["version"]
+    assert version == 1
+
+    client.post(
+        f"/api/v1/sheet/{sheet_id}/set",
+        json={"row": 10, "column": "A", "value": "hello"},
+    )
+    client.post(
+        f"/api/v1/sheet/{sheet_id}/set",
+        json={"row": 10, "column": "A", "value": "world"},
+    )
+
+    response = client.get(f"/api/v1/sheet/{sheet_id}/changes?since={version}")
+    assert response.status_code == 200
+    assert response.json() == {
+        "version": 3,
+        "changes": [
+            {"version": 3, "row": 10, "column": "A", "value": "world"},
+            {"version": 3, "row": 1, "column": "C", "value": "world"},
+        ],
+    }
+
+
+def test_get_changes_aged_out_requires_resync(create_valid_sheet):
+    """
+    Test that a version no longer covered by the change log asks for a resync.
+    """
+    sheet_id = create_valid_sheet
+    changes_url = f"/api/v1/sheet/{sheet_id}/changes"
+    for row in range(manager.change_log_size + 1):
+        client.post(
+            f"/api/v1/sheet/{sheet_id}/set",
+            json={"row": row, "column": "A", "value": "hello"},
+        )
+
+    assert client.get(f"{changes_url}?since=0").json()["resync"] is True
+    assert len(client.get(f"{changes_url}?since=1").json()["changes"]) == (
+        manager.change_log_size
+    )
+
+
+def test_get_changes_bad_call_non_existent_id():
+    """
+    Test fetching changes of a non-existent sheet.
+    """
+    response = client.get("/api/v1/sheet/non_existent_id/changes?since=0")
+    assert response.status_code == 404
+
+
+def test_set_cell_expected_version(create_valid_sheet):
+    """
+    Test compare-and-set writes against per-cell versions.
+    """
+    sheet_id = create_valid_sheet
+    set_url = f"/api/v1/sheet/{sheet_id}/set"
+
+    response = client.post(
+        set_url, json={"row": 10, "column": "A", "value": "a", "expectedVersion": 0}
+    )
+    assert response.status_code == 200
+    version = response.json()["version"]
+
+    # The version from the write is enough for the next compare-and-set
+    response = client.post(
+        set_url,
+        json={"row": 10, "column": "A", "value": "b", "expectedVersion": version},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"status": "success", "version": version + 1}
+
+    stale_response = client.post(
+        set_url,
+        json={"row": 10, "column": "A", "value": "c", "expectedVersion": version},
+    )
+    assert stale_response.status_code == 409
+    assert "expected" in stale_response.json()["detail"]
+
+    sheet = client.get(f"/api/v1/sheet/{sheet_id}?versions=true").json()
+    assert sheet["data"]["10"]["A"] == "b"
+    assert sheet["versions"]["10"]["A"] == version + 1
+
+    assert "versions" not in client.get(f"/api/v1/sheet/{sheet_id}").json()
+
+
+def test_set_cell_bad_call_invalid_body(create_valid_sheet):
+    """
+    Test that malformed set cell bodies are rejected as invalid input.
+    """
+    sheet_id = create_valid_sheet
+    set_url = f"/api/v1/sheet/{sheet_id}/set"
+
+    missing_row = client.post(set_url, json={"column": "A", "value": "hello"})
+    assert missing_row.status_code == 400
+    assert missing_row.json()["detail"] == "Invalid input schema"
+
+    bad_json = client.post(
+        set_url, content=b"{", headers={"content-type": "application/json"}
+    )
+    assert bad_json.status_code == 400
+    assert bad_json.json()["errors"][0]["type"] == "json_invalid"
+
+
+def test_set_cell_coerces_like_schema(create_valid_sheet):
+    """
+    Test that bodies outside the fast path are coerced like SetCellRequest.
+    """
+    sheet_id = create_valid_sheet
+
+    response = client.post(
+        f"/api/v1/sheet/{sheet_id}/set",
+        json={"row": "10", "column": "A", "value": "hello"},
+    )
+    assert response.status_code == 200
+    assert client.get(f"/api/v1/sheet/{sheet_id}").json()["data"]["10"]["A"] == (
+        "hello"
+    )
+
+
+def test_batch_get_sheets(create_valid_sheet, valid_sheet_schema):
+    """
+    Test reading several sheets, windows and unknown sheets in one request.
+    """
+    first_id = create_valid_sheet
+    second_id = client.post("/api/v1/sheet/", json=valid_sheet_schema).json()["sheetId"]
+    for row in range(5):
+        client.post(
+            f"/api/v1/sheet/{first_id}/set",
+            json={"row": row, "column": "A", "value": f"value {row}"},
+        )
+        client.post(
+            f"/api/v1/sheet/{first_id}/set",
+            json={"row": row, "column": "C", "value": f"lookup(A,{row})"},
+        )
+    client.post(
+        f"/api/v1/sheet/{second_id}/set",
+        json={"row": 1, "column": "B", "value": True},
+    )
+
+    response = client.post(
+        "/api/v1/sheets/batch-get",
+        json={
+            "sheets": [
+                {"id": first_id, "rows": [1, 3], "columns": ["C"]},
+                {"id": "non_existent_id"},
+                {"id": second_id},
+            ]
+        },
+    )
+    assert response.status_code == 200
+    first, missing, second = response.json()["sheets"]
+
+    assert first["data"] == {"1": {"C": "value 1"}, "2": {"C": "value 2"}}
+    assert missing == {"id": "non_existent_id", "error": "Sheet not found."}
+    assert second["id"] == second_id
+    assert second["data"] == {"1": {"B": True}}
+
+
+def test_set_cell_self_reference_is_rejected(create_valid_sheet):
+    """
+    Test that a lookup of the cell itself is rejected and leaves the cell writable.
+    """
+    sheet_id = create_valid_sheet
+    set_url = f"/api/v1/sheet/{sheet_id}/set"
+
+    response = client.post(
+        set_url, json={"row": 1, "column": "A", "value": "lookup(A,1)"}
+    )
+    assert response.status_code == 400
+    assert "Cycle detected" in response.json()["detail"]
+
+    sheet = client.get(f"/api/v1/sheet/{sheet_id}").json()
+    assert sheet["data"] == {}
+    assert sheet["version"] == 0
+
+    response = client.post(set_url, json={"row": 1, "column": "A", "value": "hello"})
+    assert response.status_code == 200
+    sheet = client.get(f"/api/v1/sheet/{sheet_id}").json()
+    assert sheet["data"]["1"]["A"] == "hello"
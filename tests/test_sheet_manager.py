@@ -0,0 +1,110 @@
+import pytest
+
+from models import ColumnSchema
+from service import SheetManager
+
+
+@pytest.fixture
+def chained_sheet():
+    """
+    Creates a sheet with two independent lookup chains and a dangling lookup.
+    """
+    manager = SheetManager()
+    columns = [ColumnSchema(name=name, type="string") for name in ("A", "B")]
+    sheet_id = manager.create_sheet(columns)
+
+    manager.set_cell(sheet_id, 0, "A", "head")
+    for row in range(1, 50):
+        manager.set_cell(sheet_id, row, "A", f"lookup(A,{row - 1})")
+    manager.set_cell(sheet_id, 0, "B", "other")
+    for row in range(1, 30):
+        manager.set_cell(sheet_id, row, "B", f"lookup(B,{row - 1})")
+    manager.set_cell(sheet_id, 30, "B", "lookup(A,100)")
+    return manager, sheet_id
+
+
+def test_components_split_independent_chains(chained_sheet):
+    """
+    Test that lookups are grouped by the chain they belong to.
+    """
+    manager, sheet_id = chained_sheet
+    sheet = manager.sheets[sheet_id]
+    lookups = [
+        (column, row)
+        for row, row_data in sheet.data.items()
+        for column, value in row_data.items()
+        if value.startswith("lookup(")
+    ]
+
+    components = manager.components(sheet, lookups)
+
+    assert sorted(len(component) for component in components) == [1, 29, 49]
+
+
+def test_parallel_resolution_matches_serial(chained_sheet):
+    """
+    Test that resolving components in worker threads gives the serial result.
+    """
+    manager, sheet_id = chained_sheet
+    serial = manager.resolve_sheet(sheet_id)
+
+    manager.parallel = True
+    manager.parallel_threshold = 1
+    parallel = manager.resolve_sheet(sheet_id)
+
+    assert parallel == serial
+    assert parallel["data"][49]["A"] == "head"
+    assert parallel["data"][29]["B"] == "other"
+    assert parallel["data"][30]["B"] == "lookup(A,100)"
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+@pytest.mark.parametrize(
+    "cycle",
+    [{1: {"A": "lookup(A,1)"}}, {1: {"A": "lookup(B,1)", "B": "lookup(A,1)"}}],
+)
+def test_stored_cycle_is_reported(chained_sheet, parallel, cycle):
+    """
+    Test that a cyclic stored lookup raises instead of hanging under the lock.
+    """
+    manager, sheet_id = chained_sheet
+    manager.parallel = parallel
+    manager.parallel_threshold = 1
+    manager.sheets[sheet_id].data.update(cycle)
+
+    with pytest.raises(ValueError, match="Cycle detected"):
+        manager.resolve_sheet(sheet_id)
+
+    assert not manager.lock.locked()
+
+
+def test_deep_chain_head_can_be_overwritten():
+    """
+    Test that chains deeper than the recursion limit are resolved and written.
+    """
+    manager = SheetManager()
+    sheet_id = manager.create_sheet([ColumnSchema(name="A", type="string")])
+    depth = 3000
+    for row in range(depth):
+        manager.set_cell(sheet_id, row, "A", f"lookup(A,{row + 1})")
+    manager.set_cell(sheet_id, depth, "A", "tail")
+
+    assert manager.get_sheet(sheet_id).data[0]["A"] == "tail"
+
+    manager.set_cell(sheet_id, 0, "A", "plain")
+
+    assert manager.get_sheet(sheet_id).data[0]["A"] == "plain"
+    assert manager.get_sheet(sheet_id).data[1]["A"] == "tail"
+
+
+def test_empty_change_log_always_requires_resync():
+    """
+    Test that a manager without a change log asks every client to resync.
+    """
+    manager = SheetManager(change_log_size=0)
+    sheet_id = manager.create_sheet([ColumnSchema(name="A", type="string")])
+    for row in range(3):
+        manager.set_cell(sheet_id, row, "A", "value")
+
+    assert manager.get_changes(sheet_id, 0) == (3, None)
+    assert manager.get_changes(sheet_id, 3) == (3, [])
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from main import app
+from subscriptions import SheetSubscriptions
+
+client = TestClient(app)
+
+
+def test_subscribe_receives_snapshot(create_valid_sheet):
+    """
+    Test that a new subscriber first receives the full sheet.
+    """
+    sheet_id = create_valid_sheet
+    client.post(
+        f"/api/v1/sheet/{sheet_id}/set",
+        json={"row": 10, "column": "A", "value": "hello"},
+    )
+
+    with client.websocket_connect(f"/api/v1/ws/sheet/{sheet_id}") as websocket:
+        message = websocket.receive_json()
+
+    assert message["type"] == "snapshot"
+    assert message["sheet"]["data"]["10"]["A"] == "hello"
+
+
+def test_subscribe_non_existent_sheet():
+    """
+    Test that subscribing to an unknown sheet is rejected.
+    """
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/api/v1/ws/sheet/non_existent_id") as ws:
+            ws.receive_json()
+
+
+def test_write_pushes_changed_lookups(create_valid_sheet):
+    """
+    Test that a write pushes the written cell and the lookups resolving through it.
+    """
+    sheet_id = create_valid_sheet
+    client.post(
+        f"/api/v1/sheet/{sheet_id}/set",
+        json={"row": 1, "column": "C", "value": "lookup(A,10)"},
+    )
+    client.post(
+        f"/api/v1/sheet/{sheet_id}/set",
+        json={"row": 2, "column": "A", "value": "lookup(C,1)"},
+    )
+
+    with client.websocket_connect(f"/api/v1/ws/sheet/{sheet_id}") as websocket:
+        assert websocket.receive_json()["type"] == "snapshot"
+
+        client.post(
+            f"/api/v1/sheet/{sheet_id}/set",
+            json={"row": 10, "column": "A", "value": "hello"},
+        )
+        message = websocket.receive_json()
+
+    assert message["type"] == "cells"
+    cells = {(c["row"], c["column"]): c["value"] for c in message["cells"]}
+    assert cells == {(10, "A"): "hello", (1, "C"): "hello", (2, "A"): "hello"}
+
+
+def test_unchanged_write_is_not_pushed(create_valid_sheet):
+    """
+    Test that rewriting the same value does not notify subscribers.
+    """
+    sheet_id = create_valid_sheet
+    client.post(
+        f"/api/v1/sheet/{sheet_id}/set",
+        json={"row": 10, "column": "A", "value": "hello"},
+    )
+
+    with client.websocket_connect(f"/api/v1/ws/sheet/{sheet_id}") as websocket:
+        websocket.receive_json()
+        client.post(
+            f"/api/v1/sheet/{sheet_id}/set",
+            json={"row": 10, "column": "A", "value": "hello"},
+        )
+        client.post(
+            f"/api/v1/sheet/{sheet_id}/set",
+            json={"row": 11, "column": "B", "value": True},
+        )
+        message = websocket.receive_json()
+
+    assert message["cells"] == [{"row": 11, "column": "B", "value": True}]
+
+
+def test_publish_coalesces_per_tick():
+    """
+    Test that writes within one event-loop tick are delivered as one message.
+    """
+
+    async def scenario():
+        subscriptions = SheetSubscriptions()
+        subscriber = subscriptions.subscribe("sheet")
+        subscriptions.publish("sheet", [(1, 1, "A", "x")])
+        subscriptions.publish("sheet", [(2, 1, "A", "y"), (3, 2, "A", "z")])
+        await asyncio.sleep(0)
+        return [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+
+    messages = asyncio.run(scenario())
+
+    assert len(messages) == 1
+    assert messages[0]["version"] == 3
+    assert messages[0]["cells"] == [
+        {"row": 1, "column": "A", "value": "y"},
+        {"row": 2, "column": "A", "value": "z"},
+    ]
+
+
+def test_slow_subscriber_is_told_to_resync():
+    """
+    Test that an overflowing subscriber queue is replaced by a resync message.
+    """
+
+    async def scenario():
+        subscriptions = SheetSubscriptions(max_queue=2)
+        subscriber = subscriptions.subscribe("sheet")
+        for row in range(3):
+            subscriptions.publish("sheet", [(row + 1, row, "A", "x")])
+            await asyncio.sleep(0)
+        return [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+
+    messages = asyncio.run(scenario())
+
+    assert messages == [{"type": "resync", "sheetId": "sheet"}]